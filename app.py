@@ -3,56 +3,124 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from io import StringIO
+from pathlib import Path
+from scipy.optimize import nnls
 
-# Theory spectra data (embedded for deployment)
-THEORY_SPECTRA = {
-    "SnCl6": {"wavenumbers": [290.84, 228.5, 152.4], "intensities": [417, 13.89, 90.5]},
-    "SnBr6": {"wavenumbers": [174.59, 135.64, 95.51], "intensities": [1968.58, 61.18, 173.52]},
-    "SnCl5Br": {"wavenumbers": [290.27, 288.23, 259.8, 226.45, 207.01, 158.88, 146.21, 130.05, 110.16], "intensities": [253.29, 7.4, 182.98, 10.97, 140.95, 6.35, 64.67, 62.64, 84.33]},
-    "SnCl4Br2 (cis)": {"wavenumbers": [287.73, 284.61, 244.01, 223.06, 192.49, 155.6, 140.7, 130.56, 119.69, 103.7], "intensities": [239.22, 5.84, 223.61, 8.86, 323.86, 68.9, 1.85, 35.9, 59.62, 95.83]},
-    "SnCl4Br2 (trans)": {"wavenumbers": [266.05809, 227.36, 149.22, 123.39, 117.22], "intensities": [510.16, 16.53, 60.2, 118.44, 23.91]},
-    "SnCl3Br3 (fac)": {"wavenumbers": [285.14, 268.06, 196.28, 186.02, 148.36, 135.16, 121.61, 115.72, 101.6], "intensities": [240.45, 8.27, 494.54, 2.42, 91.09, 74.44, 23.82, 16.99, 106.58]},
-    "SnCl3Br3 (mer)": {"wavenumbers": [281.75, 276.58, 243.85, 213.87, 178.86, 156.72, 138.98, 122.67, 114.97, 101.15], "intensities": [2.46, 177.25, 334.36, 10.2, 316.35, 19.72, 33.18, 62.17, 4.0, 65.71]},
-    "SnCl2Br4 (cis)": {"wavenumbers": [276.38, 210.44, 190.86, 173.81, 158.42, 139.74, 122.19, 113.19, 104.68, 97.09], "intensities": [198.27, 15.21, 647.7, 318.57, 93.11, 73.2, 10.11, 42.92, 27.22, 65.06]},
-    "SnCl2Br4 (trans)": {"wavenumbers": [244.76, 161.6, 135.91, 112.12, 100.61], "intensities": [559.22, 301.5, 6.74, 118.88, 14.98]},
-    "SnCl1Br5": {"wavenumbers": [268.54, 208.14, 184.37, 150.98, 135.81, 123.88, 109.06, 101.27, 97.69], "intensities": [122.58, 14.5, 845.04, 109.05, 13.32, 19.24, 10.73, 66.04, 60.49]}
-}
-
-SPECTRUM_ORDER = [
-    "SnCl6", "SnCl5Br", "SnCl4Br2 (cis)", "SnCl4Br2 (trans)",
-    "SnCl3Br3 (fac)", "SnCl3Br3 (mer)", "SnCl2Br4 (cis)", 
-    "SnCl2Br4 (trans)", "SnCl1Br5", "SnBr6"
-]
+try:
+    # Kept out of this file so reruns reuse the compiled dispatcher
+    from kernels import lorentz_sum
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+# Working precision for spectra; single precision is ample for 4-digit peak
+# data and halves memory traffic in the basis and fit products
+DTYPE = np.float32
+
+# Theory peak tables, prebuilt by build_theory_npz.py as padded
+# (species, peak) arrays with zero-intensity padding
+with np.load(Path(__file__).with_name("theory.npz")) as _theory:
+    SPECTRUM_ORDER = _theory["NAMES"].tolist()
+    WN = _theory["WN"].astype(DTYPE)
+    INT = _theory["INT"].astype(DTYPE)
+
+# Experimental traces are thinned to about this many points for plotting
+MAX_PLOT_POINTS = 5000
 
-def lorentzian(x, x0, intensity, gamma=4.0):
-    """Generate Lorentzian peak."""
-    return intensity * (gamma**2) / ((x - x0)**2 + gamma**2)
+# Wavenumber grid shared by all theory spectra
+X_RANGE = np.linspace(0, 400, 2000, dtype=DTYPE)
+X_RANGE.flags.writeable = False
 
 def generate_spectrum(wavenumbers, intensities, x_range, shift=0, gamma=4.0):
-    """Convert discrete peaks to continuous spectrum."""
-    spectrum = np.zeros_like(x_range)
-    for wn, intensity in zip(wavenumbers, intensities):
-        spectrum += lorentzian(x_range, wn + shift, intensity, gamma)
-    return spectrum
+    """Convert discrete peaks to continuous spectrum.
+
+    2D (species, peak) inputs give one spectrum per column of the result.
+    """
+    x_range = np.asarray(x_range, dtype=DTYPE)
+    wn = np.atleast_2d(np.asarray(wavenumbers, dtype=DTYPE)) + DTYPE(shift)
+    inten = np.atleast_2d(np.asarray(intensities, dtype=DTYPE))
+    gamma = DTYPE(gamma)
+    if HAVE_NUMBA:
+        spectra = lorentz_sum(x_range, wn, inten, gamma)
+    else:
+        # Broadcast grid points against all peaks at once and sum over peaks
+        delta = x_range[:, None, None] - wn[None, :, :]
+        g2 = gamma * gamma
+        spectra = (inten * g2 / (delta * delta + g2)).sum(axis=2)
+    return spectra[:, 0] if np.ndim(wavenumbers) == 1 else spectra
+
+# Caches are shared by all sessions, so bound them to keep memory flat
+@st.cache_resource(show_spinner=False, max_entries=256)
+def build_basis(gamma, shift):
+    """Build matrix of unit-coefficient theory spectra, one column per species."""
+    B = generate_spectrum(WN, INT, X_RANGE, shift=shift, gamma=gamma)
+    # Shared across sessions without copying, so guard against mutation
+    B.flags.writeable = False
+    return B
+
+def interp_uniform(x, grid, values):
+    """Linearly interpolate rows of values on an evenly spaced grid.
+
+    Equivalent to np.interp (endpoints clamped) but indexes the grid
+    directly instead of bisecting, and handles 2D values column-wise.
+    """
+    dx = (grid[-1] - grid[0]) / (len(grid) - 1)
+    t = np.clip((x - grid[0]) / dx, 0, len(grid) - 1)
+    i = np.minimum(t.astype(np.intp), len(grid) - 2)
+    f = t - i.astype(t.dtype)
+    if values.ndim == 2:
+        f = f[:, None]
+    return values[i] * (1 - f) + values[i + 1] * f
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def project_basis(gamma, shift, exp_x):
+    """Interpolate each basis spectrum onto the experimental wavenumbers."""
+    B_exp = interp_uniform(exp_x, X_RANGE, build_basis(gamma, shift))
+    B_exp.flags.writeable = False
+    return B_exp
 
 def parse_xy_file(content):
     """Parse XY file content."""
-    lines = content.strip().split('\n')
-    x_data, y_data = [], []
-    
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-        parts = line.replace(',', ' ').replace('\t', ' ').split()
-        if len(parts) >= 2:
-            try:
-                x_data.append(float(parts[0]))
-                y_data.append(float(parts[1]))
-            except ValueError:
-                continue
-    
-    return np.array(x_data), np.array(y_data)
+    # Commas become whitespace so the fast C parser can split on '\s+'
+    try:
+        df = pd.read_csv(
+            StringIO(content.replace(',', ' ')),
+            sep=r'\s+',
+            comment='#',
+            header=None,
+            names=[0, 1],
+            usecols=[0, 1],
+            index_col=False,
+            on_bad_lines='skip'
+        )
+    except (pd.errors.EmptyDataError, pd.errors.ParserError):
+        # Nothing parseable as two columns (empty, comment-only, one column)
+        return np.array([]), np.array([])
+
+    # Drop header rows and lines without two numeric columns
+    df = df.apply(pd.to_numeric, errors='coerce').dropna()
+    return df[0].to_numpy(dtype=float), df[1].to_numpy(dtype=float)
+
+@st.cache_data(show_spinner=False)
+def load_experimental(file_bytes):
+    """Parse uploaded file, restrict to 0-400 cm⁻¹ and normalize to max = 1000."""
+    exp_x, exp_y = parse_xy_file(file_bytes.decode('utf-8'))
+
+    # Filter to 0-400 range; sorted files (the usual case) are sliced as views
+    if np.all(np.diff(exp_x) >= 0):
+        lo = np.searchsorted(exp_x, 0)
+        hi = np.searchsorted(exp_x, 400, side='right')
+        exp_x, exp_y = exp_x[lo:hi], exp_y[lo:hi]
+    else:
+        mask = (exp_x >= 0) & (exp_x <= 400)
+        exp_x, exp_y = exp_x[mask], exp_y[mask]
+
+    # Normalize experimental spectrum to max = 1000 (similar scale to theory)
+    if len(exp_y) > 0 and np.max(exp_y) > 0:
+        exp_y = exp_y * (1000.0 / np.max(exp_y))
+    exp_x = exp_x.astype(DTYPE, copy=False)
+    exp_y = exp_y.astype(DTYPE, copy=False)
+    return exp_x, exp_y
 
 st.set_page_config(page_title="Raman Spectrum Fitting", layout="wide")
 
@@ -67,6 +135,15 @@ uploaded_file = st.sidebar.file_uploader(
     help="Two-column file with wavenumber and intensity"
 )
 
+exp_x, exp_y = None, None
+if uploaded_file is not None:
+    exp_x, exp_y = load_experimental(uploaded_file.getvalue())
+    # Stride used to thin experimental traces for plotting
+    plot_step = max(1, int(np.ceil(len(exp_x) / MAX_PLOT_POINTS)))
+    
+    if len(exp_y) > 0 and np.max(exp_y) > 0:
+        st.sidebar.success(f"✓ Loaded {len(exp_x)} points (normalized)")
+
 st.sidebar.header("⚙️ Peak Parameters")
 gamma = st.sidebar.slider("Peak width (FWHM)", 1.0, 20.0, 4.0, 0.5,
                           help="Lorentzian line width parameter")
@@ -75,72 +152,51 @@ rigid_shift = st.sidebar.slider("Rigid wavenumber shift (cm⁻¹)", -50.0, 50.0,
 
 st.sidebar.header("📊 Coefficient Controls")
 
-# Store coefficients in session state
-if 'coefficients' not in st.session_state:
-    st.session_state.coefficients = {name: 0.0 for name in SPECTRUM_ORDER}
+# Coefficients live in the slider widget state
+for name in SPECTRUM_ORDER:
+    st.session_state.setdefault(f"coef_{name}", 0.0)
 
-# Reset button
+# Reset button; the click's own rerun picks up the cleared values
 if st.sidebar.button("Reset All Coefficients"):
     for name in SPECTRUM_ORDER:
-        st.session_state.coefficients[name] = 0.0
-    st.rerun()
+        st.session_state[f"coef_{name}"] = 0.0
 
-# Coefficient sliders
+# Auto-fit: the model is linear in the coefficients, so solve for them
+# directly with non-negative least squares against the experimental data
+if st.sidebar.button("Auto-fit Coefficients",
+                     disabled=exp_x is None or len(exp_x) == 0,
+                     help="Least-squares fit of all coefficients to the uploaded spectrum"):
+    fit_coefs, _ = nnls(project_basis(gamma, rigid_shift, exp_x), exp_y)
+    fit_coefs = np.clip(fit_coefs, 0.0, 2.0)
+    for name, value in zip(SPECTRUM_ORDER, fit_coefs):
+        st.session_state[f"coef_{name}"] = round(float(value), 2)
+
+# Coefficient sliders, batched in a form so dragging doesn't rerun the fit
 coefficients = {}
-for name in SPECTRUM_ORDER:
-    coefficients[name] = st.sidebar.slider(
-        name, 0.0, 2.0, 
-        st.session_state.coefficients.get(name, 0.0), 
-        0.01,
-        key=f"coef_{name}"
-    )
-    st.session_state.coefficients[name] = coefficients[name]
+with st.sidebar.form("coefs"):
+    for name in SPECTRUM_ORDER:
+        coefficients[name] = st.slider(
+            name, 0.0, 2.0, step=0.01, key=f"coef_{name}"
+        )
+    st.form_submit_button("Update fit")
 
 # Main content area
-x_range = np.linspace(0, 400, 2000)
-
 # Generate fitted spectrum
-fitted_spectrum = np.zeros_like(x_range)
-individual_spectra = {}
+B = build_basis(gamma, rigid_shift)
+coef_vector = np.array([coefficients[name] for name in SPECTRUM_ORDER], dtype=DTYPE)
+fitted_spectrum = B @ coef_vector
 
-for name in SPECTRUM_ORDER:
-    if coefficients[name] > 0:
-        spec_data = THEORY_SPECTRA[name]
-        individual = generate_spectrum(
-            spec_data['wavenumbers'], 
-            spec_data['intensities'],
-            x_range, 
-            shift=rigid_shift,
-            gamma=gamma
-        )
-        individual_spectra[name] = individual * coefficients[name]
-        fitted_spectrum += individual_spectra[name]
-
-# Create the plot
-fig = go.Figure()
+# Collect plot traces, then build the figure in one go
+traces = []
 
 # Plot experimental data if uploaded
-exp_x, exp_y = None, None
-if uploaded_file is not None:
-    content = uploaded_file.getvalue().decode('utf-8')
-    exp_x, exp_y = parse_xy_file(content)
-    
-    # Filter to 0-400 range
-    mask = (exp_x >= 0) & (exp_x <= 400)
-    exp_x, exp_y = exp_x[mask], exp_y[mask]
-    
-    # Normalize experimental spectrum to max = 1000 (similar scale to theory)
-    if len(exp_y) > 0 and np.max(exp_y) > 0:
-        exp_y = exp_y * (1000.0 / np.max(exp_y))
-        st.sidebar.success(f"✓ Loaded {len(exp_x)} points (normalized)")
-    
-    if len(exp_x) > 0:
-        fig.add_trace(go.Scatter(
-            x=exp_x, y=exp_y,
-            mode='lines',
-            name='Experimental',
-            line=dict(color='black', width=2)
-        ))
+if exp_x is not None and len(exp_x) > 0:
+    traces.append(go.Scattergl(
+        x=exp_x[::plot_step], y=exp_y[::plot_step],
+        mode='lines',
+        name='Experimental',
+        line=dict(color='black', width=2)
+    ))
 
 # Plot individual theory spectra (semi-transparent)
 colors = [
@@ -148,25 +204,27 @@ colors = [
     '#ffff33', '#a65628', '#f781bf', '#999999', '#66c2a5'
 ]
 
-for i, name in enumerate(SPECTRUM_ORDER):
-    if name in individual_spectra:
-        fig.add_trace(go.Scatter(
-            x=x_range, y=individual_spectra[name],
-            mode='lines',
-            name=name,
-            line=dict(color=colors[i], width=1),
-            opacity=0.5
-        ))
+traces.extend(
+    go.Scattergl(
+        x=X_RANGE, y=B[:, i] * coef_vector[i],
+        mode='lines',
+        name=name,
+        line=dict(color=colors[i], width=1),
+        opacity=0.5
+    )
+    for i, name in enumerate(SPECTRUM_ORDER) if coef_vector[i] > 0
+)
 
 # Plot fitted sum
 if np.any(fitted_spectrum > 0):
-    fig.add_trace(go.Scatter(
-        x=x_range, y=fitted_spectrum,
+    traces.append(go.Scattergl(
+        x=X_RANGE, y=fitted_spectrum,
         mode='lines',
         name='Fitted Sum',
         line=dict(color='red', width=2, dash='dash')
     ))
 
+fig = go.Figure(data=traces)
 fig.update_layout(
     title="Raman Spectrum Fitting",
     xaxis_title="Wavenumber (cm⁻¹)",
@@ -186,19 +244,21 @@ st.plotly_chart(fig, use_container_width=True)
 
 # Display active coefficients
 st.subheader("Active Components")
-active = {name: coef for name, coef in coefficients.items() if coef > 0}
-if active:
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown("**Species Contributions:**")
-        for name, coef in active.items():
-            st.write(f"- {name}: {coef:.2f}")
-    with col2:
-        total = sum(active.values())
-        if total > 0:
-            st.markdown("**Relative Fractions:**")
-            for name, coef in active.items():
-                st.write(f"- {name}: {100*coef/total:.1f}%")
+active_mask = coef_vector > 0
+if active_mask.any():
+    active_coefs = coef_vector[active_mask]
+    st.dataframe(
+        pd.DataFrame({
+            "Species": np.array(SPECTRUM_ORDER)[active_mask],
+            "Coefficient": active_coefs,
+            "Fraction (%)": 100 * active_coefs / active_coefs.sum()
+        }),
+        hide_index=True,
+        column_config={
+            "Coefficient": st.column_config.NumberColumn(format="%.2f"),
+            "Fraction (%)": st.column_config.NumberColumn(format="%.1f")
+        }
+    )
 else:
     st.info("Adjust the coefficient sliders to add theory spectra to the fit.")
 
@@ -206,22 +266,25 @@ else:
 if exp_x is not None and len(exp_x) > 0 and np.any(fitted_spectrum > 0):
     st.subheader("Fit Quality")
     
-    # Interpolate fitted to experimental x values
-    fitted_interp = np.interp(exp_x, x_range, fitted_spectrum)
+    # Fitted spectrum at experimental x values from the projected basis
+    B_exp = project_basis(gamma, rigid_shift, exp_x)
+    fitted_interp = B_exp @ coef_vector
     
     residual = exp_y - fitted_interp
-    ss_res = np.sum(residual**2)
-    ss_tot = np.sum((exp_y - np.mean(exp_y))**2)
+    ss_res = float(residual @ residual)
+    centered = exp_y - exp_y.mean()
+    ss_tot = float(centered @ centered)
     r_squared = 1 - ss_res / ss_tot if ss_tot > 0 else 0
+    rms = np.sqrt(ss_res / residual.size)
     
     col1, col2 = st.columns(2)
     col1.metric("R²", f"{r_squared:.4f}")
-    col2.metric("RMS Residual", f"{np.sqrt(np.mean(residual**2)):.2f}")
+    col2.metric("RMS Residual", f"{rms:.2f}")
     
     # Residual plot
     fig_resid = go.Figure()
-    fig_resid.add_trace(go.Scatter(
-        x=exp_x, y=residual,
+    fig_resid.add_trace(go.Scattergl(
+        x=exp_x[::plot_step], y=residual[::plot_step],
         mode='lines',
         name='Residual',
         line=dict(color='gray')
@@ -251,7 +314,8 @@ with st.expander("📖 Instructions"):
     3. **Apply a rigid shift** if your theory and experimental wavenumbers are offset
     
     4. **Adjust coefficients** for each SnX₆ species to fit the experimental spectrum
-       - The fit updates in real-time as you move the sliders
+       - Click **Update fit** to apply slider changes to the fit
+       - Or click **Auto-fit Coefficients** to solve for the best non-negative fit
        
     5. **View fit quality** metrics if experimental data is loaded
     
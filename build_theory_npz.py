@@ -0,0 +1,51 @@
+"""Build theory.npz, the peak tables loaded by app.py.
+
+Run once after editing the peak data below:
+
+    python build_theory_npz.py
+"""
+from pathlib import Path
+
+import numpy as np
+
+# Theory spectra data
+THEORY_SPECTRA = {
+    "SnCl6": {"wavenumbers": [290.84, 228.5, 152.4], "intensities": [417, 13.89, 90.5]},
+    "SnBr6": {"wavenumbers": [174.59, 135.64, 95.51], "intensities": [1968.58, 61.18, 173.52]},
+    "SnCl5Br": {"wavenumbers": [290.27, 288.23, 259.8, 226.45, 207.01, 158.88, 146.21, 130.05, 110.16], "intensities": [253.29, 7.4, 182.98, 10.97, 140.95, 6.35, 64.67, 62.64, 84.33]},
+    "SnCl4Br2 (cis)": {"wavenumbers": [287.73, 284.61, 244.01, 223.06, 192.49, 155.6, 140.7, 130.56, 119.69, 103.7], "intensities": [239.22, 5.84, 223.61, 8.86, 323.86, 68.9, 1.85, 35.9, 59.62, 95.83]},
+    "SnCl4Br2 (trans)": {"wavenumbers": [266.05809, 227.36, 149.22, 123.39, 117.22], "intensities": [510.16, 16.53, 60.2, 118.44, 23.91]},
+    "SnCl3Br3 (fac)": {"wavenumbers": [285.14, 268.06, 196.28, 186.02, 148.36, 135.16, 121.61, 115.72, 101.6], "intensities": [240.45, 8.27, 494.54, 2.42, 91.09, 74.44, 23.82, 16.99, 106.58]},
+    "SnCl3Br3 (mer)": {"wavenumbers": [281.75, 276.58, 243.85, 213.87, 178.86, 156.72, 138.98, 122.67, 114.97, 101.15], "intensities": [2.46, 177.25, 334.36, 10.2, 316.35, 19.72, 33.18, 62.17, 4.0, 65.71]},
+    "SnCl2Br4 (cis)": {"wavenumbers": [276.38, 210.44, 190.86, 173.81, 158.42, 139.74, 122.19, 113.19, 104.68, 97.09], "intensities": [198.27, 15.21, 647.7, 318.57, 93.11, 73.2, 10.11, 42.92, 27.22, 65.06]},
+    "SnCl2Br4 (trans)": {"wavenumbers": [244.76, 161.6, 135.91, 112.12, 100.61], "intensities": [559.22, 301.5, 6.74, 118.88, 14.98]},
+    "SnCl1Br5": {"wavenumbers": [268.54, 208.14, 184.37, 150.98, 135.81, 123.88, 109.06, 101.27, 97.69], "intensities": [122.58, 14.5, 845.04, 109.05, 13.32, 19.24, 10.73, 66.04, 60.49]}
+}
+
+SPECTRUM_ORDER = [
+    "SnCl6", "SnCl5Br", "SnCl4Br2 (cis)", "SnCl4Br2 (trans)",
+    "SnCl3Br3 (fac)", "SnCl3Br3 (mer)", "SnCl2Br4 (cis)", 
+    "SnCl2Br4 (trans)", "SnCl1Br5", "SnBr6"
+]
+
+
+def main():
+    # Padded (species, peak) arrays in SPECTRUM_ORDER; padding has zero
+    # intensity so it contributes nothing to the summed spectra
+    counts = np.array([len(THEORY_SPECTRA[name]["wavenumbers"]) for name in SPECTRUM_ORDER])
+    wn = np.zeros((len(SPECTRUM_ORDER), counts.max()))
+    inten = np.zeros((len(SPECTRUM_ORDER), counts.max()))
+    for i, name in enumerate(SPECTRUM_ORDER):
+        wn[i, :counts[i]] = THEORY_SPECTRA[name]["wavenumbers"]
+        inten[i, :counts[i]] = THEORY_SPECTRA[name]["intensities"]
+
+    np.savez(
+        Path(__file__).with_name("theory.npz"),
+        NAMES=np.array(SPECTRUM_ORDER),
+        WN=wn,
+        INT=inten,
+        COUNTS=counts
+    )
+
+if __name__ == "__main__":
+    main()
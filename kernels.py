@@ -0,0 +1,22 @@
+"""Compiled kernels for app.py.
+
+Kept in a separate module so the Numba dispatchers persist across Streamlit
+reruns, which re-execute app.py but reuse modules already imported.
+"""
+import numpy as np
+from numba import njit
+
+@njit(fastmath=True, cache=True)
+def lorentz_sum(x, wn, inten, gamma):
+    """Sum Lorentzian peaks for each row of wn/inten in a single pass over the grid."""
+    out = np.empty((x.size, wn.shape[0]), dtype=x.dtype)
+    g2 = gamma * gamma
+    for i in range(x.size):
+        xi = x[i]
+        for k in range(wn.shape[0]):
+            s = 0.0
+            for j in range(wn.shape[1]):
+                d = xi - wn[k, j]
+                s += inten[k, j] * g2 / (d * d + g2)
+            out[i, k] = s
+    return out